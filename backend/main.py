@@ -1,11 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import pandas as pd
 import chromadb
+from chromadb.utils import embedding_functions
 import ollama
 import json
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
+import math
 import os
 from pathlib import Path
 import traceback
@@ -14,6 +18,20 @@ from contextlib import asynccontextmanager
 import traceback
 from datetime import datetime
 import uuid
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional speedups - fall back to the stdlib encoder / gzip when not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
 
 pending_solutions: Dict[str, dict] = {}  # In-memory storage for demo
 reviewed_solutions: Dict[str, dict] = {}
@@ -27,10 +45,26 @@ collection = None
 tech_df = None
 db_metadata_file = Path("./chroma_db/database_metadata.json")
 
+# Retrieval tuning - embedding cache size and micro-batching window for concurrent queries
+EMBEDDING_CACHE_SIZE = 256
+RETRIEVAL_BATCH_WINDOW_SECONDS = 0.005
+RETRIEVAL_MAX_BATCH_SIZE = 32
+LLM_MAX_CONCURRENCY = 1  # Ollama generations run one at a time, as before
+
+# Separate pools (created per lifespan) so long LLM generations never hold up retrieval
+retrieval_executor = None
+llm_executor = None
+
+# Same model Chroma uses by default - challenges are embedded here and queried via query_embeddings.
+# Not thread-safe: only touched from the single retrieval_executor worker
+embedding_function = embedding_functions.DefaultEmbeddingFunction()
+embedding_cache: "OrderedDict[str, list]" = OrderedDict()
+
 class SolutionSubmission(BaseModel):
     submission_id: str
     challenge: dict
-    solutions: List[dict]
+    technologies: Dict[str, dict]  # shared technology table keyed by tech_id
+    solutions: List[dict]  # compact solutions - technologies are {tech_id, relevance_score, reasoning} references
     submitted_at: str
     status: str
 
@@ -38,6 +72,29 @@ class ReviewAction(BaseModel):
     action: str  # "approve" or "reject"
     feedback: Optional[str] = None
 
+def replace_non_finite(value):
+    """Replace NaN/Infinity floats with None, recursively"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: replace_non_finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [replace_non_finite(item) for item in value]
+    return value
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when it is installed"""
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            try:
+                return super().render(content)
+            except ValueError:
+                # stdlib rejects NaN/Infinity - write them as null, like orjson does
+                return super().render(replace_non_finite(content))
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
 # keep track of changes to the excel file
 def get_file_hash(file_path: str) -> str:
     """Generate MD5 hash of file to detect changes"""
@@ -100,7 +157,10 @@ def load_technology_database():
         tech_df.reset_index(drop=True, inplace=True)
         
         try:
-            collection = chroma_client.get_collection(name="technologies")
+            collection = chroma_client.get_collection(
+                name="technologies",
+                embedding_function=embedding_function
+            )
             print(f"✅ Loaded {len(tech_df)} technologies from cache (indices: 0-{len(tech_df)-1})")
             return len(tech_df)
         except:
@@ -132,7 +192,8 @@ def load_technology_database():
     
     collection = chroma_client.create_collection(
         name="technologies",
-        metadata={"description": "NZTC Technology Database"}
+        metadata={"description": "NZTC Technology Database"},
+        embedding_function=embedding_function
     )
     
     documents = []
@@ -178,6 +239,8 @@ def load_technology_database():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load database on startup"""
+    global retrieval_executor, llm_executor
+    
     print("=" * 60)
     print("🚀 NZTC Innovation Co-Pilot Starting")
     print("=" * 60)
@@ -200,14 +263,35 @@ async def lifespan(app: FastAPI):
         print(f"❌ Database error: {e}")
         traceback.print_exc()
     
+    # Warm up the embedding model so the first request doesn't pay for loading it
+    try:
+        embedding_function(["warm up"])
+        print("✅ Embedding model warmed up")
+    except Exception as e:
+        print(f"⚠️  Embedding warm-up failed: {e}")
+    
+    print(f"{'✅' if orjson else '⚠️ '} JSON encoder: {'orjson' if orjson else 'stdlib json (pip install orjson)'}")
+    print(f"{'✅' if BrotliMiddleware else '⚠️ '} Compression: {'brotli + gzip' if BrotliMiddleware else 'gzip only (pip install brotli-asgi)'}")
+    
     print("=" * 60)
     print(f"🌐 Server ready at http://localhost:8001")
     print("=" * 60)
     
-    yield
+    # single retrieval worker also serializes the embedding model and its cache
+    retrieval_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval")
+    llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+    try:
+        yield
+    finally:
+        retrieval_executor.shutdown(wait=False, cancel_futures=True)
+        llm_executor.shutdown(wait=False, cancel_futures=True)
 
 
-app = FastAPI(title="NZTC Innovation Co-Pilot API", lifespan=lifespan)
+app = FastAPI(
+    title="NZTC Innovation Co-Pilot API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -217,6 +301,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses - brotli if available, otherwise gzip
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=1000, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 
 # models
 class ChallengeInput(BaseModel):
@@ -229,7 +319,7 @@ class ChallengeInput(BaseModel):
     constraints: Optional[List[str]] = []
 
 
-class TechnologyMatch(BaseModel):
+class TechnologyInfo(BaseModel):
     tech_id: str
     title: str
     provider: str
@@ -237,6 +327,9 @@ class TechnologyMatch(BaseModel):
     trl: str
     category: str
     sub_category: str
+
+
+class TechnologyMatch(TechnologyInfo):
     relevance_score: float
     reasoning: str
 
@@ -261,50 +354,219 @@ class SolutionResponse(BaseModel):
     submission_id: Optional[str] = None
 
 
+# compact format - each technology is sent once, solutions reference it by tech_id
+class TechnologyReference(BaseModel):
+    tech_id: str
+    relevance_score: float
+    reasoning: str
+
+
+class CompactSolution(Solution):
+    technologies: List[TechnologyReference]
+
+
+class CompactSolutionResponse(BaseModel):
+    technologies: Dict[str, TechnologyInfo]
+    solutions: List[CompactSolution]
+    processing_time: float
+    technologies_analyzed: int
+    submission_id: Optional[str] = None
+
+
+TECHNOLOGY_INFO_FIELDS = tuple(TechnologyInfo.model_fields)
+
+
+def compact_solutions(solutions: List[dict]) -> dict:
+    """Split solution dicts into a shared technology table and per-solution references"""
+    technologies = {}
+    compact = []
+    for sol in solutions:
+        refs = []
+        for tech in sol['technologies']:
+            if tech['tech_id'] not in technologies:
+                technologies[tech['tech_id']] = {field: tech[field] for field in TECHNOLOGY_INFO_FIELDS}
+            refs.append({
+                'tech_id': tech['tech_id'],
+                'relevance_score': tech['relevance_score'],
+                'reasoning': tech['reasoning']
+            })
+        compact.append({**sol, 'technologies': refs})
+    return {'technologies': technologies, 'solutions': compact}
+
+
+def expand_solutions(technologies: Dict[str, dict], solutions: List[dict]) -> List[dict]:
+    """Inverse of compact_solutions - inline the full technology into each reference"""
+    return [
+        {**sol, 'technologies': [{**technologies[ref['tech_id']], **ref} for ref in sol['technologies']]}
+        for sol in solutions
+    ]
+
+
+def present_submission(submission: dict, compact: bool = False) -> dict:
+    """Submissions are stored compact; expand them unless the caller asked for compact.
+    The expanded view is rebuilt on every read - a shallow copy per solution, cheap next to encoding."""
+    if compact:
+        return submission
+    view = {key: value for key, value in submission.items() if key != 'technologies'}
+    view['solutions'] = expand_solutions(submission['technologies'], submission['solutions'])
+    return view
+
+
 # query_relevant_technologies and generate_solutions_with_llm functions
-def query_relevant_technologies(challenge: str, n_results: int = 15) -> List[dict]:
-    """Query ChromaDB for relevant technologies"""
-    if collection is None:
-        raise HTTPException(status_code=500, detail="Technology database not loaded")
+def embed_challenges(challenges: List[str]) -> List[list]:
+    """Embed challenge texts, only running the model for ones not in the LRU cache.
+    Must run on retrieval_executor - the cache has no lock of its own."""
+    embeddings = {}
+    for text in challenges:
+        if text in embedding_cache:
+            embedding_cache.move_to_end(text)
+            embeddings[text] = embedding_cache[text]
+    
+    missing = [text for text in dict.fromkeys(challenges) if text not in embeddings]
+    if missing:
+        for text, embedding in zip(missing, embedding_function(missing)):
+            embeddings[text] = embedding
+        
+        for text in missing:
+            embedding_cache[text] = embeddings[text]
+            embedding_cache.move_to_end(text)
+        while len(embedding_cache) > EMBEDDING_CACHE_SIZE:
+            embedding_cache.popitem(last=False)
     
+    return [embeddings[text] for text in challenges]
+
+
+def query_technologies_batch(challenges: List[str], n_results: List[int]) -> List[List[dict]]:
+    """Query ChromaDB for relevant technologies for several challenges in one call"""
     try:
         results = collection.query(
-            query_texts=[challenge],
-            n_results=min(n_results, len(tech_df))
+            query_embeddings=embed_challenges(challenges),
+            n_results=min(max(n_results), len(tech_df))
         )
         
-        technologies = []
         max_idx = len(tech_df) - 1
+        batch = []
         
-        for i in range(len(results['ids'][0])):
-            tech_id_str = results['metadatas'][0][i]['tech_id']
-            tech_id = int(tech_id_str)
-            
-            # Safety check
-            if tech_id > max_idx:
-                print(f"⚠️ Skipping invalid tech_id {tech_id} (max: {max_idx})")
-                continue
+        for q, limit in enumerate(n_results):
+            technologies = []
             
-            tech_row = tech_df.iloc[tech_id]
+            for i in range(min(limit, len(results['ids'][q]))):
+                tech_id_str = results['metadatas'][q][i]['tech_id']
+                tech_id = int(tech_id_str)
+                
+                # Safety check
+                if tech_id > max_idx:
+                    print(f"⚠️ Skipping invalid tech_id {tech_id} (max: {max_idx})")
+                    continue
+                
+                tech_row = tech_df.iloc[tech_id]
+                
+                technologies.append({
+                    'tech_id': tech_id_str,
+                    'title': tech_row.get('Title', 'N/A'),
+                    'provider': tech_row.get('Technology Provider', 'N/A'),
+                    'description': tech_row.get('Technology Description', 'N/A'),
+                    'trl': str(tech_row.get('TRL', 'N/A')),
+                    'category': tech_row.get('Category', 'N/A'),
+                    'sub_category': tech_row.get('Sub-Category', 'N/A'),
+                    'distance': results['distances'][q][i]
+                })
             
-            technologies.append({
-                'tech_id': tech_id_str,
-                'title': tech_row.get('Title', 'N/A'),
-                'provider': tech_row.get('Technology Provider', 'N/A'),
-                'description': tech_row.get('Technology Description', 'N/A'),
-                'trl': str(tech_row.get('TRL', 'N/A')),
-                'category': tech_row.get('Category', 'N/A'),
-                'sub_category': tech_row.get('Sub-Category', 'N/A'),
-                'distance': results['distances'][0][i]
-            })
+            batch.append(technologies)
         
-        return technologies
+        return batch
         
     except Exception as e:
         print(f"❌ Query Error: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
 
+
+class RetrievalBatcher:
+    """Gathers retrieval requests arriving within a short window into one embed-and-query call"""
+    
+    def __init__(self, window_seconds: float, max_batch_size: int):
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.pending = []
+        self.timer = None
+        self.tasks = set()
+    
+    async def query(self, challenge: str, n_results: int) -> List[dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((challenge, n_results, future))
+        
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window_seconds, self.flush)
+        
+        return await future
+    
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        
+        batch, self.pending = self.pending, []
+        if batch:
+            # keep a reference so the task isn't garbage collected mid-flight
+            task = asyncio.create_task(self.run(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+    
+    async def run(self, batch: list):
+        if len(batch) > 1:
+            print(f"📦 Batched {len(batch)} retrieval requests")
+        
+        outcomes = await self.execute(
+            [challenge for challenge, _, _ in batch],
+            [n_results for _, n_results, _ in batch]
+        )
+        
+        # one bad challenge shouldn't fail everyone else in the batch - retry each on its own
+        if isinstance(outcomes, Exception) and len(batch) > 1:
+            print(f"⚠️ Batched retrieval failed, retrying {len(batch)} requests individually")
+            outcomes = [
+                result if isinstance(result, Exception) else result[0]
+                for result in await asyncio.gather(*[
+                    self.execute([challenge], [n_results]) for challenge, n_results, _ in batch
+                ])
+            ]
+        elif isinstance(outcomes, Exception):
+            outcomes = [outcomes]
+        
+        for (_, _, future), outcome in zip(batch, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                # fresh exception per request so tracebacks don't accumulate across waiters
+                detail = outcome.detail if isinstance(outcome, HTTPException) else f"Database query failed: {str(outcome)}"
+                future.set_exception(HTTPException(status_code=500, detail=detail))
+            else:
+                future.set_result(outcome)
+    
+    async def execute(self, challenges: List[str], n_results: List[int]):
+        """Run one batched query on the retrieval worker, returning the results or the exception"""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                retrieval_executor, query_technologies_batch, challenges, n_results
+            )
+        except Exception as e:
+            return e
+
+
+retrieval_batcher = RetrievalBatcher(RETRIEVAL_BATCH_WINDOW_SECONDS, RETRIEVAL_MAX_BATCH_SIZE)
+
+
+async def query_relevant_technologies(challenge: str, n_results: int = 15) -> List[dict]:
+    """Query ChromaDB for relevant technologies (batched with concurrent requests)"""
+    if collection is None:
+        raise HTTPException(status_code=500, detail="Technology database not loaded")
+    
+    return await retrieval_batcher.query(challenge, n_results)
+
 def extract_json_from_text(text: str) -> str:
     """Robustly extract JSON from text with potential extra content"""
     # Find first opening brace
@@ -558,9 +820,9 @@ async def database_status():
     }
 
 
-@app.post("/api/generate-solutions", response_model=SolutionResponse)
-async def generate_solutions(challenge: ChallengeInput):
-    """Generate AI-powered solution concepts"""
+@app.post("/api/generate-solutions", response_model=Union[SolutionResponse, CompactSolutionResponse])
+async def generate_solutions(challenge: ChallengeInput, compact: bool = False):
+    """Generate AI-powered solution concepts (?compact=true for the deduplicated format)"""
     import time
     start_time = time.time()
     
@@ -568,26 +830,40 @@ async def generate_solutions(challenge: ChallengeInput):
         raise HTTPException(status_code=503, detail="Database not loaded")
     
     try:
-        relevant_techs = query_relevant_technologies(
+        relevant_techs = await query_relevant_technologies(
             challenge.challenge_description, 
             n_results=15
         )
         
-        solutions = generate_solutions_with_llm(challenge, relevant_techs)
+        # run the blocking LLM call off the event loop so concurrent retrievals can batch
+        solutions = await asyncio.get_running_loop().run_in_executor(
+            llm_executor, generate_solutions_with_llm, challenge, relevant_techs
+        )
         processing_time = time.time() - start_time
         
-        # ⭐ Store for admin review
+        # ⭐ Store for admin review (compact - each technology stored once)
         submission_id = str(uuid.uuid4())
+        compacted = compact_solutions([sol.model_dump() for sol in solutions])
         pending_solutions[submission_id] = {
             "submission_id": submission_id,
             "challenge": challenge.model_dump(),
-            "solutions": [sol.model_dump() for sol in solutions],
+            "technologies": compacted["technologies"],
+            "solutions": compacted["solutions"],
             "submitted_at": datetime.now().isoformat(),
             "status": "pending"
         }
         
         print(f"✅ Stored submission {submission_id} for review")
         
+        if compact:
+            return {
+                "technologies": compacted["technologies"],
+                "solutions": compacted["solutions"],
+                "processing_time": processing_time,
+                "technologies_analyzed": len(relevant_techs),
+                "submission_id": submission_id
+            }
+        
         return {
             "solutions": solutions,
             "processing_time": processing_time,
@@ -605,29 +881,30 @@ async def generate_solutions(challenge: ChallengeInput):
 # admin endpoints
 
 @app.get("/api/admin/submissions")
-async def get_all_submissions():
+async def get_all_submissions(compact: bool = False):
     """Get all solution submissions for review"""
     all_submissions = {**pending_solutions, **reviewed_solutions}
-    return {
+    # stored submissions are plain JSON data - render directly and skip jsonable_encoder
+    return FastJSONResponse({
         "total": len(all_submissions),
         "pending": len([s for s in all_submissions.values() if s["status"] == "pending"]),
         "approved": len([s for s in all_submissions.values() if s["status"] == "approved"]),
         "rejected": len([s for s in all_submissions.values() if s["status"] == "rejected"]),
-        "submissions": list(all_submissions.values())
-    }
+        "submissions": [present_submission(s, compact) for s in all_submissions.values()]
+    })
 
 
 @app.get("/api/admin/submissions/pending")
-async def get_pending_submissions():
+async def get_pending_submissions(compact: bool = False):
     """Get pending submissions only"""
-    return {
+    return FastJSONResponse({
         "count": len(pending_solutions),
-        "submissions": list(pending_solutions.values())
-    }
+        "submissions": [present_submission(s, compact) for s in pending_solutions.values()]
+    })
 
 
 @app.post("/api/admin/submissions/{submission_id}/review")
-async def review_submission(submission_id: str, review: ReviewAction):
+async def review_submission(submission_id: str, review: ReviewAction, compact: bool = False):
     """Review a solution submission"""
     print(f"🔍 Received review request for {submission_id}: {review.action}")
     
@@ -656,20 +933,20 @@ async def review_submission(submission_id: str, review: ReviewAction):
     print(f"   Pending count: {len(pending_solutions)}")
     print(f"   Reviewed count: {len(reviewed_solutions)}")
     
-    return {
+    return FastJSONResponse({
         "message": f"Submission {review.action}d successfully",
-        "submission": submission
-    }
+        "submission": present_submission(submission, compact)
+    })
 
 
 
 @app.get("/api/admin/submissions/{submission_id}")
-async def get_submission_detail(submission_id: str):
+async def get_submission_detail(submission_id: str, compact: bool = False):
     """Get detailed view of a specific submission"""
     submission = pending_solutions.get(submission_id) or reviewed_solutions.get(submission_id)
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
-    return submission
+    return FastJSONResponse(present_submission(submission, compact))
 
 
 @app.get("/")
@@ -0,0 +1,119 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+class FakeCollection:
+    """Returns technologies 0..n-1 for every query; fails on any embedding listed in `bad`"""
+
+    def __init__(self, bad=()):
+        self.bad = set(bad)
+        self.calls = []
+
+    def query(self, query_embeddings, n_results):
+        self.calls.append(len(query_embeddings))
+        if any(embedding[0] in self.bad for embedding in query_embeddings):
+            raise RuntimeError("bad embedding")
+        count = len(query_embeddings)
+        return {
+            'ids': [[f"tech_{i}" for i in range(n_results)]] * count,
+            'metadatas': [[{'tech_id': str(i)} for i in range(n_results)]] * count,
+            'distances': [[0.1] * n_results] * count,
+        }
+
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    embedded = []
+
+    def fake_embedding_function(texts):
+        embedded.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(main, "embedding_function", fake_embedding_function)
+    monkeypatch.setattr(main, "embedding_cache", OrderedDict())
+    monkeypatch.setattr(main, "EMBEDDING_CACHE_SIZE", 2)
+    monkeypatch.setattr(main, "tech_df", pd.DataFrame({'Title': [f"Tech {i}" for i in range(20)]}))
+    monkeypatch.setattr(main, "collection", FakeCollection())
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(main, "retrieval_executor", executor)
+    yield embedded
+    executor.shutdown()
+
+
+def run_batch(*requests):
+    """Submit all requests in the same batching window"""
+    async def gather():
+        batcher = main.RetrievalBatcher(window_seconds=0.01, max_batch_size=32)
+        return await asyncio.gather(
+            *[batcher.query(challenge, n_results) for challenge, n_results in requests],
+            return_exceptions=True
+        )
+    return asyncio.run(gather())
+
+
+def test_embedding_cache_hit_and_eviction(retrieval):
+    main.embed_challenges(["a", "bb"])
+    main.embed_challenges(["a"])
+    assert retrieval == [["a", "bb"]]
+
+    # "bb" is now least recently used and gets evicted
+    main.embed_challenges(["ccc"])
+    assert list(main.embedding_cache) == ["a", "ccc"]
+
+    main.embed_challenges(["bb"])
+    assert retrieval[-1] == ["bb"]
+
+
+def test_batch_trims_each_request_to_its_n_results(retrieval):
+    results = run_batch(("a", 15), ("bb", 3), ("a", 5))
+
+    assert [len(technologies) for technologies in results] == [15, 3, 5]
+    assert main.collection.calls == [3]
+    assert retrieval == [["a", "bb"]]
+
+
+def test_failed_batch_isolates_the_bad_request(retrieval):
+    # "bb" embeds to [2.0], which the collection rejects
+    main.collection = FakeCollection(bad={2.0})
+
+    good, bad = run_batch(("a", 4), ("bb", 4))
+
+    assert len(good) == 4
+    assert isinstance(bad, HTTPException)
+    assert bad.status_code == 500
+    assert "bad embedding" in bad.detail
+
+
+def test_failed_batch_gives_each_request_its_own_exception(retrieval):
+    main.collection = FakeCollection(bad={1.0, 2.0})
+
+    first, second = run_batch(("a", 4), ("bb", 4))
+
+    assert isinstance(first, HTTPException) and isinstance(second, HTTPException)
+    assert first is not second
+
+
+def test_compact_round_trip():
+    def tech(tech_id):
+        return {
+            'tech_id': tech_id, 'title': 't', 'provider': 'p', 'description': 'd',
+            'trl': '5', 'category': 'c', 'sub_category': 's',
+            'relevance_score': 0.5, 'reasoning': f"role {tech_id}",
+        }
+
+    solutions = [
+        {'solution_id': 1, 'technologies': [tech('1'), tech('2')]},
+        {'solution_id': 2, 'technologies': [tech('2'), tech('3')]},
+    ]
+    compacted = main.compact_solutions(solutions)
+
+    assert list(compacted['technologies']) == ['1', '2', '3']
+    assert main.expand_solutions(compacted['technologies'], compacted['solutions']) == solutions